@@ -1,8 +1,8 @@
 # ingest.py
 from pathlib import Path
 from typing import Optional
-from utils.data_loader import load_csv
-from utils.rag_utils import upsert_dataframe_as_docs
+from utils.data_loader import load_csv_iter
+from utils.rag_utils import upsert_dataframe_chunks
 
 DATA_DIR = Path("data")
 
@@ -20,27 +20,26 @@ def dynamic_ingest(
       - can accept id_cols to form stable IDs.
     """
     print(f"\n📂 Ingesting {csv_path} -> namespace '{namespace}'")
-    df = load_csv(csv_path)
+    frames = load_csv_iter(csv_path, block_size=1 << 20)  # ~1 MB of CSV per frame; stream: parse, embed & upsert overlap
 
-    if df is None or df.shape[0] == 0:
-        print(f"⚠️  No data found in {csv_path}")
-        return
-
-    print(f"   Rows loaded: {len(df)} | Columns: {list(df.columns)}")
-
-    upsert_dataframe_as_docs(
-        df,
+    rows = upsert_dataframe_chunks(
+        frames,
         namespace=namespace,
         text_cols=None,        # None = auto-select inside rag_utils
         meta_cols=None,        # None = all columns
         id_cols=id_cols,       # optional stable id columns
         id_prefix=id_prefix,
-        batch_size=64,
+        batch_size=512,        # docs per Chroma upsert
         max_chars_per_doc=1500,
-        auto_text_only=auto_text_only
+        auto_text_only=auto_text_only,
+        encode_batch_size=256  # texts per embedder forward pass
     )
 
-    print(f"✅ Completed ingestion for '{namespace}' ({len(df)} rows)")
+    if not rows:
+        print(f"⚠️  No data found in {csv_path}")
+        return
+
+    print(f"✅ Completed ingestion for '{namespace}' ({rows} rows)")
 
 if __name__ == "__main__":
     dynamic_ingest("data/sentiment_data.csv", "sentiment", id_cols=None, id_prefix="s-", auto_text_only=False)
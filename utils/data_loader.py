@@ -1,13 +1,85 @@
 # utils/data_loader.py
+import re
+from typing import Dict, Iterator
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
 
-def load_csv(path: str, **kwargs) -> pd.DataFrame:
+_COLUMN_ERROR = re.compile(r"In CSV column #(\d+)")
+
+def _open_csv(path: str, encoding: str, column_types: Dict[str, pa.DataType], block_size: int):
+    """pyarrow's streaming CSV reader; `column_types` fixes the type of the columns it names."""
+    return pv.open_csv(
+        path,
+        read_options=pv.ReadOptions(encoding=encoding, block_size=block_size),
+        # Empty cells are nulls in text columns too, as in pandas
+        convert_options=pv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+    )
+
+def _iter_batches(path: str, block_size: int) -> Iterator[pa.RecordBatch]:
+    """
+    Stream a CSV as Arrow record batches with pyarrow's multithreaded reader.
+    Column types are inferred from the first block and pinned for the rest of the file;
+    dates/times and all-empty columns are read as text. If a later block doesn't fit
+    (bytes that aren't utf-8, or a value of another type), the file is re-opened as latin-1
+    or with that column as text, skipping the rows already yielded.
+    """
+    encoding, column_types, rows = "utf8", None, 0
+    while True:
+        reader = _open_csv(path, encoding, column_types or {}, block_size)
+        schema = reader.schema
+        if column_types is None:
+            if encoding == "utf8" and any(pa.types.is_binary(f.type) for f in schema):
+                # pyarrow doesn't raise on bytes it can't decode: it reads the column as binary
+                encoding = "latin1"
+                continue
+            column_types = {
+                f.name: pa.string() if pa.types.is_temporal(f.type) or pa.types.is_null(f.type) else f.type
+                for f in schema
+            }
+            if column_types != dict(zip(schema.names, schema.types)):
+                continue  # re-open with dates and empty columns as text
+        skip = rows
+        try:
+            for batch in reader:
+                if skip >= batch.num_rows:
+                    skip -= batch.num_rows
+                    continue
+                batch, skip = batch.slice(skip), 0
+                rows += batch.num_rows
+                yield batch
+            return
+        except pa.ArrowInvalid as e:
+            # e.g. "In CSV column #2: Row #50001: CSV conversion error to int64: invalid value 'abc'"
+            m = _COLUMN_ERROR.match(str(e))
+            if m is None:
+                raise
+            name = schema.names[int(m[1])]
+            if "invalid UTF8" in str(e) and encoding == "utf8":
+                encoding = "latin1"  # Fallback for messy CSVs
+            elif column_types[name] != pa.string():
+                column_types[name] = pa.string()
+            else:
+                raise
+
+def load_csv(path: str, block_size: int = 1 << 20) -> pd.DataFrame:
+    """
+    Load a CSV into a pandas DataFrame with Arrow-backed columns.
+    Defaults to utf-8 encoding (latin-1 fallback); same dtypes as load_csv_iter.
+    """
+    batches = list(_iter_batches(path, block_size))
+    if not batches:
+        return pd.DataFrame()
+    # Columns only ever fall back to text, so the last batch has the final schema
+    schema = batches[-1].schema
+    table = pa.Table.from_batches([b if b.schema == schema else b.cast(schema) for b in batches])
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def load_csv_iter(path: str, block_size: int = 1 << 20) -> Iterator[pd.DataFrame]:
     """
-    Load a CSV into a pandas DataFrame.
-    Defaults to utf-8 encoding and handles common parsing options.
+    Stream a CSV as DataFrames of about `block_size` bytes of input each, so peak RAM is one chunk.
+    utf-8 with latin-1 fallback, Arrow-backed columns, dates as text;
+    every chunk has the first chunk's dtypes, except columns that had to fall back to text.
     """
-    try:
-        return pd.read_csv(path, encoding="utf-8", **kwargs)
-    except UnicodeDecodeError:
-        # Fallback for messy CSVs
-        return pd.read_csv(path, encoding="latin-1", **kwargs)
+    for batch in _iter_batches(path, block_size):
+        yield batch.to_pandas(types_mapper=pd.ArrowDtype)
@@ -1,26 +1,211 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 from pathlib import Path
+from functools import lru_cache
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
+import torch
+import numpy as np
 import pandas as pd
-import hashlib
+import pyarrow as pa
+from blake3 import blake3
+import atexit
+import os
+import platform
+import re
+import threading
+
+try:  # optional: ONNX Runtime encoder (pip install "optimum[onnxruntime]")
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+except ImportError:
+    ORTModelForFeatureExtraction = None
 
 PERSIST_DIR = str(Path(".chroma").absolute())
+ONNX_CACHE_DIR = Path(".onnx").absolute()  # exported (and quantized) ONNX encoders
+# Dynamic INT8 quantization of the ONNX encoder. Off by default: queries are still embedded by
+# Chroma's fp32 MiniLM (query_namespace), so only enable it after checking stored-vs-query cosine.
+ONNX_INT8 = False
 _EMBEDDER = None
+_ENCODE_POOL = None  # SentenceTransformer multi-process pool (CPU only), started on demand
+_EMBED_CACHE: "OrderedDict[bytes, np.ndarray]" = OrderedDict()  # blake3(text) -> vector, LRU
+_EMBED_CACHE_SIZE = 50_000  # ~40 MB of fp16 MiniLM vectors
+# Ingest pipeline: rows are prepared on the caller's thread, embedded on _EMBED_POOL, written on _UPSERT_POOL
+_EMBED_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+_UPSERT_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upsert")
 
 # ---------------- Embeddings ---------------- #
+def _cpu_flags() -> set:
+    """x86 feature flags from /proc/cpuinfo (empty set where unavailable)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+def _int8_config():
+    """
+    Dynamic INT8 config for this CPU, as (name, config):
+    arm64 on ARM, VNNI kernels where the CPU has them, else AVX2 with reduce_range
+    (plain AVX2/AVX512 U8S8 GEMMs can saturate without it).
+    """
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64", AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    if _cpu_flags() & {"avx512_vnni", "avx_vnni"}:
+        return "vnni", AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    return "avx2", AutoQuantizationConfig.avx2(is_static=False, per_channel=False, reduce_range=True)
+
+class _OnnxEmbedder:
+    """
+    ONNX Runtime port of a sentence-transformers model (mean pooling, like MiniLM).
+    Exposes the subset of SentenceTransformer.encode() that _embed relies on.
+    """
+
+    def __init__(self, model_name: str, max_seq_length: int = 256, quantize: Optional[bool] = None):
+        quantize = ONNX_INT8 if quantize is None else quantize  # read at load time, so the flag can be set after import
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = self._load(model_name, quantize)
+        self.max_seq_length = max_seq_length
+
+    @staticmethod
+    def _load(model_name: str, quantize: bool):
+        """Export to ONNX once (cached under ONNX_CACHE_DIR), optionally as a dynamic INT8 model."""
+        save_dir = ONNX_CACHE_DIR / model_name.replace("/", "__")
+        provider = "CPUExecutionProvider"
+        if quantize:
+            # One quantized file per config, so a cache copied to a different CPU isn't reused
+            qname, qconfig = _int8_config()
+            quantized = save_dir / f"model_int8_{qname}.onnx"
+            if quantized.exists():
+                return ORTModelForFeatureExtraction.from_pretrained(save_dir, file_name=quantized.name, provider=provider)
+
+        if (save_dir / "model.onnx").exists():
+            model = ORTModelForFeatureExtraction.from_pretrained(save_dir, provider=provider)
+        else:
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True, provider=provider)
+            model.save_pretrained(save_dir)
+        if not quantize:
+            return model
+
+        # Weights stored as int8, activations quantized per batch: INT8 GEMMs.
+        # Outputs stay float32, since Chroma's HNSW index is float.
+        ORTQuantizer.from_pretrained(model).quantize(
+            save_dir=save_dir, quantization_config=qconfig, file_suffix=f"int8_{qname}"
+        )
+        return ORTModelForFeatureExtraction.from_pretrained(save_dir, file_name=quantized.name, provider=provider)
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = False, **_) -> np.ndarray:
+        # Smart batching: encode in length order so each batch pads only to its own longest text
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+        out = []
+        for start in range(0, len(sorted_texts), batch_size):
+            enc = self.tokenizer(
+                sorted_texts[start:start + batch_size],
+                padding="longest", truncation=True, max_length=self.max_seq_length, return_tensors="np"
+            )
+            hidden = self.model(**enc).last_hidden_state
+            # Mean-pool token vectors, ignoring padding
+            mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+            out.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        if not out:
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        emb = np.empty((len(texts), out[0].shape[1]), dtype=out[0].dtype)
+        emb[order] = np.concatenate(out)  # back to input order
+        if normalize_embeddings:
+            emb = emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+        return emb
+
+def _pick_device() -> str:
+    """Best available torch device: CUDA, then Apple MPS, then CPU."""
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
 def get_embedder(model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-    """Lazy-load the SentenceTransformer embedder on first use."""
+    """
+    Lazy-load the embedder on first use.
+    - GPU/MPS: SentenceTransformer on that device in fp16.
+    - CPU: ONNX Runtime if optimum is installed, else SentenceTransformer.
+    """
     global _EMBEDDER
     if _EMBEDDER is None:
-        _EMBEDDER = SentenceTransformer(model_name)
+        device = _pick_device()
+        if device == "cpu" and ORTModelForFeatureExtraction is not None:
+            _EMBEDDER = _OnnxEmbedder(model_name)
+        else:
+            _EMBEDDER = SentenceTransformer(model_name, device=device)
+            if device != "cpu":
+                _EMBEDDER.half()  # fp16: negligible cosine drift for MiniLM
     return _EMBEDDER
 
-def _embed(texts: List[str], model_name: Optional[str] = None) -> List[List[float]]:
-    """Encode texts into vectors. SentenceTransformer handles internal batching."""
+def _get_encode_pool(embedder):
+    """
+    Lazily start a multi-process encode pool for a CPU SentenceTransformer on a 4+ core box.
+    Returns None when it does not apply (GPU, ONNX Runtime, or too few cores).
+    """
+    global _ENCODE_POOL
+    if _ENCODE_POOL is None:
+        cores = os.cpu_count() or 1
+        if not isinstance(embedder, SentenceTransformer) or embedder.device.type != "cpu" or cores < 4:
+            return None
+        _ENCODE_POOL = embedder.start_multi_process_pool(target_devices=["cpu"] * min(4, cores))
+        atexit.register(embedder.stop_multi_process_pool, _ENCODE_POOL)
+    return _ENCODE_POOL
+
+def _embed(texts: List[str], model_name: Optional[str] = None, batch_size: int = 256) -> np.ndarray:
+    """
+    Encode texts into unit-length vectors, returned as a float16 (n, dim) array.
+    fp16 keeps cosine within ~1e-4 for MiniLM and halves what we hand to Chroma
+    (which upcasts to float32 for its HNSW index).
+    The embedder splits texts into encode batches of batch_size.
+    """
     embedder = get_embedder(model_name or "sentence-transformers/all-MiniLM-L6-v2")
-    return embedder.encode(texts, normalize_embeddings=True).tolist()
+    pool = _get_encode_pool(embedder) if len(texts) >= 128 else None
+    if pool is not None:
+        # Worker processes sidestep the GIL; small inputs aren't worth the IPC
+        emb = embedder.encode_multi_process(texts, pool, batch_size=batch_size, normalize_embeddings=True)
+    else:
+        emb = embedder.encode(
+            texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False
+        )
+    return emb.astype(np.float16, copy=False)
+
+def _embed_dedup(texts: List[str], batch_size: int = 256) -> np.ndarray:
+    """
+    _embed behind a content-addressed LRU cache: a text already embedded (earlier in the
+    ingest or twice in this batch) is encoded only once. Only the single _EMBED_POOL
+    worker calls this, so the cache needs no lock.
+    """
+    if not texts:
+        return _embed(texts, batch_size=batch_size)
+    hashes = [blake3(b).digest() for b in map(str.encode, texts)]
+    unseen = {}
+    for h, t in zip(hashes, texts):
+        if h not in _EMBED_CACHE and h not in unseen:
+            unseen[h] = t
+    if unseen:
+        for h, vec in zip(unseen, _embed(list(unseen.values()), batch_size=batch_size)):
+            _EMBED_CACHE[h] = vec.copy()  # own the row; a view would pin the whole batch array
+
+    emb = np.stack([_EMBED_CACHE[h] for h in hashes])
+    for h in hashes:
+        _EMBED_CACHE.move_to_end(h)
+    while len(_EMBED_CACHE) > _EMBED_CACHE_SIZE:
+        _EMBED_CACHE.popitem(last=False)
+    return emb
+
+def _embed_batch(docs: List[str], metas: List[Dict[str, Any]], ids: List[str], encode_batch_size: int = 256):
+    """Embed one upsert batch; returns (docs, metas, ids, embeddings). Runs on _EMBED_POOL."""
+    return docs, metas, ids, _embed_dedup(docs, batch_size=encode_batch_size)
 
 # ---------------- Chroma Client ---------------- #
 def get_client():
@@ -31,20 +216,80 @@ def get_collection(namespace: str):
     return client.get_or_create_collection(name=namespace, metadata={"hnsw:space": "cosine"})
 
 # ---------------- Helpers ---------------- #
+def _key_part(value: Any) -> str:
+    """One cell of a row key; nulls are "nan" on every dtype backend (matches _join_columns)."""
+    return "nan" if pd.isna(value) else str(value)
+
 def _row_to_key(row: pd.Series, id_cols: Optional[List[str]] = None, chunk_index: Optional[int] = None) -> str:
     """Create a canonical string for a row to be hashed into an ID."""
     if id_cols:
-        parts = [str(row.get(c, "")) for c in id_cols]
+        parts = [_key_part(row.get(c, "")) for c in id_cols]
     else:
-        parts = [str(v) for v in row.values]
+        parts = [_key_part(v) for v in row.values]
     if chunk_index is not None:
         parts.append(str(chunk_index))
     return "|".join(parts)
 
 def stable_id_from_row(row: pd.Series, id_cols: Optional[List[str]] = None, id_prefix: str = "") -> str:
-    """Return a deterministic id for a row (md5 of chosen key)."""
+    """Return a deterministic id for a row (128-bit blake3 of chosen key)."""
     key = _row_to_key(row, id_cols=id_cols, chunk_index=None)
-    return id_prefix + hashlib.md5(key.encode("utf-8")).hexdigest()
+    return _ids_for_keys([key], id_prefix)[0]
+
+def _is_text_dtype(dtype) -> bool:
+    """Text column for auto_text_only: string/object, or Arrow null (all-empty so far, e.g. in a first chunk)."""
+    if isinstance(dtype, pd.ArrowDtype) and pa.types.is_null(dtype.pyarrow_dtype):
+        return True
+    return pd.api.types.is_string_dtype(dtype)
+
+def _ids_for_keys(keys: List[str], id_prefix: str = "") -> List[str]:
+    """Hash a batch of row keys into document ids (same digest as stable_id_from_row)."""
+    return [id_prefix + blake3(kb).hexdigest(length=16) for kb in map(str.encode, keys)]
+
+def _join_columns(df: pd.DataFrame, cols: List[str], sep: str, notna: pd.DataFrame, skip_na: bool = False) -> List[str]:
+    """
+    Join ``cols`` row-wise into one string per row, column by column (no per-row Python loop).
+    ``notna`` is df.notna(). Null cells are skipped if skip_na, else written as "nan".
+    """
+    if not cols:
+        return [""] * len(df)
+    # Nulls are masked explicitly: astype(str) renders them as "nan", "<NA>" or keeps NaN
+    # depending on the dtype backend and pandas version
+    strs = df[cols].astype(str)
+    if skip_na:
+        # Null cells contribute nothing (not even a separator); trim the trailing sep afterwards
+        strs = (strs + sep).where(notna[cols], "")
+        joined = strs.iloc[:, 0]
+        for j in range(1, strs.shape[1]):
+            joined = joined + strs.iloc[:, j]
+        return joined.str.removesuffix(sep).tolist()
+    strs = strs.where(notna[cols], "nan")
+    joined = strs.iloc[:, 0]
+    for j in range(1, strs.shape[1]):
+        joined = joined + sep + strs.iloc[:, j]
+    return joined.tolist()
+
+def _metadata_records(df: pd.DataFrame, cols: List[str], notna: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    One metadata dict per row with Chroma-friendly values: nulls become None and
+    non-scalar columns (e.g. dates parsed by the pyarrow reader) become strings.
+    """
+    types = pd.api.types
+    frame = df[cols]
+    to_str = {
+        c: str for c, dt in frame.dtypes.items()
+        if not (types.is_numeric_dtype(dt) or types.is_bool_dtype(dt) or types.is_string_dtype(dt))
+    }
+    if to_str:
+        frame = frame.astype(to_str)
+    frame = frame.astype(object).where(notna[cols], None)
+    # Values are already plain Python objects after astype(object), so zip plain tuples
+    # (itertuples name=None) instead of to_dict(), which re-boxes every cell
+    return [dict(zip(cols, row)) for row in frame.itertuples(index=False, name=None)]
+
+@lru_cache(maxsize=8)
+def _chunk_re(max_chars: int) -> "re.Pattern[str]":
+    """Compiled 'up to max_chars of anything' pattern, cached per chunk size."""
+    return re.compile(f".{{1,{max_chars}}}", re.S)
 
 def chunk_text(text: str, max_chars: int = 1500) -> List[str]:
     """Split a long string into character chunks (simple but effective)."""
@@ -53,7 +298,43 @@ def chunk_text(text: str, max_chars: int = 1500) -> List[str]:
     text = text.strip()
     if len(text) <= max_chars:
         return [text]
-    return [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
+    # One C-level scan instead of a Python slice per chunk
+    return _chunk_re(max_chars).findall(text)
+
+def _upsert_embedded(coll, future: Future, abort: threading.Event) -> None:
+    """
+    Wait for an _embed_batch future and write its batch to Chroma. Runs on _UPSERT_POOL.
+    Writes nothing once abort is set, and sets it on failure so later batches are skipped too.
+    """
+    try:
+        docs, metas, ids, embeddings = future.result()
+        if abort.is_set():
+            return
+        coll.upsert(documents=docs, metadatas=metas, ids=ids, embeddings=embeddings)
+    except BaseException:
+        abort.set()
+        raise
+
+def _submit_batch(
+    coll, in_flight: deque, abort: threading.Event, docs, metas, ids, encode_batch_size: int, max_in_flight: int = 2
+) -> None:
+    """
+    Queue one batch: embed on _EMBED_POOL, then upsert on _UPSERT_POOL once embedded.
+    Blocks only while more than max_in_flight batches are pending (backpressure).
+    """
+    embedded = _EMBED_POOL.submit(_embed_batch, docs, metas, ids, encode_batch_size)
+    in_flight.append((embedded, _UPSERT_POOL.submit(_upsert_embedded, coll, embedded, abort)))
+    while len(in_flight) > max_in_flight:
+        in_flight.popleft()[1].result()  # also re-raises embed/upsert errors
+
+def _cancel_in_flight(in_flight: deque, abort: threading.Event) -> None:
+    """Stop queued batches and wait for running ones, so nothing is written after we return."""
+    abort.set()
+    futures = [f for pair in in_flight for f in pair]
+    for f in futures:
+        f.cancel()
+    wait(futures)
+    in_flight.clear()
 
 # ---------------- Upsert ---------------- #
 def upsert_dataframe_as_docs(
@@ -63,67 +344,136 @@ def upsert_dataframe_as_docs(
     meta_cols: Optional[List[str]] = None,
     id_cols: Optional[List[str]] = None,
     id_prefix: str = "",
-    batch_size: int = 64,
+    batch_size: int = 512,
     max_chars_per_doc: int = 1500,
-    auto_text_only: bool = False
+    auto_text_only: bool = False,
+    encode_batch_size: int = 256
 ):
     """
     Upsert dataframe rows into a Chroma collection in batches.
     - If text_cols is None, use all cols (or only string cols if auto_text_only=True).
     - If meta_cols is None, use all cols.
-    - If id_cols is None, row hash is used for stable ID.
+    - If id_cols is None, row hash is used for stable ID; given id_cols must exist (ValueError).
+    - batch_size is rows per Chroma upsert; encode_batch_size is texts per embedder forward pass.
     """
     if df is None or df.shape[0] == 0:
         return
 
-    all_cols = list(df.columns)
-    if text_cols is None:
-        if auto_text_only:
-            text_cols = [c for c in all_cols if df[c].dtype == "object"]
-            if not text_cols:  # fallback
-                text_cols = all_cols.copy()
-        else:
-            text_cols = all_cols.copy()
+    upsert_dataframe_chunks(
+        [df],
+        namespace=namespace,
+        text_cols=text_cols,
+        meta_cols=meta_cols,
+        id_cols=id_cols,
+        id_prefix=id_prefix,
+        batch_size=batch_size,
+        max_chars_per_doc=max_chars_per_doc,
+        auto_text_only=auto_text_only,
+        encode_batch_size=encode_batch_size
+    )
+
+def upsert_dataframe_chunks(
+    frames: Iterable[pd.DataFrame],
+    namespace: str,
+    text_cols: Optional[List[str]] = None,
+    meta_cols: Optional[List[str]] = None,
+    id_cols: Optional[List[str]] = None,
+    id_prefix: str = "",
+    batch_size: int = 512,
+    max_chars_per_doc: int = 1500,
+    auto_text_only: bool = False,
+    encode_batch_size: int = 256
+) -> int:
+    """
+    Streaming variant of upsert_dataframe_as_docs for an iterable of DataFrames
+    (e.g. utils.data_loader.load_csv_iter), so peak RAM is one frame, not the whole file.
+    - Columns are resolved from the first non-empty frame, with the same rules.
+    - Embedding/upserting runs while the next frame is parsed.
+    Returns the number of rows ingested.
+    """
+    coll = None
+    # Docs accumulate in flat per-frame lists; each full batch is submitted as an exact-size
+    # slice (a fresh list), so nothing handed to the worker threads is ever mutated or reset.
+    in_flight = deque()  # pending (embed, upsert) futures, oldest first
+    abort = threading.Event()  # set on any failure: workers stop writing
+    docs, doc_keys, doc_metas = [], [], []  # keys are hashed into ids per batch at submit time
+    submitted = 0
+    n_rows = 0
+
+    try:
+        for df in frames:
+            if df is None or df.shape[0] == 0:
+                continue
+
+            all_cols = list(df.columns)
+            if coll is None:
+                missing = [c for c in (id_cols or []) if c not in all_cols]
+                if missing:
+                    raise ValueError(f"id_cols not found in dataframe columns: {missing} (columns: {all_cols})")
 
-    if meta_cols is None:
-        meta_cols = all_cols.copy()
+                if text_cols is None:
+                    if auto_text_only:
+                        text_cols = [c for c in all_cols if _is_text_dtype(df[c].dtype)]
+                        if not text_cols:  # fallback
+                            text_cols = all_cols.copy()
+                    else:
+                        text_cols = all_cols.copy()
 
-    coll = get_collection(namespace)
+                if meta_cols is None:
+                    meta_cols = all_cols.copy()
 
-    docs_batch, ids_batch, metas_batch = [], [], []
-    for _, row in df.iterrows():
-        # Document text
-        parts = [str(row[c]) for c in text_cols if pd.notna(row.get(c, None))]
-        text = " | ".join(parts)
+                coll = get_collection(namespace)
+            n_rows += len(df)
 
-        # Chunk if long
-        chunks = chunk_text(text, max_chars_per_doc) or [""]
+            # Build texts, metadata and id keys column-wise up front; only chunking stays per row.
+            # The null mask is computed once for the whole frame and shared by text and metadata.
+            notna = df.notna()
+            texts = _join_columns(df, text_cols, " | ", notna, skip_na=True)
+            metas = _metadata_records(df, meta_cols, notna)
+            keys = _join_columns(df, id_cols if id_cols else all_cols, "|", notna)
 
-        for i, chunk in enumerate(chunks):
-            if id_cols:
-                key = _row_to_key(row, id_cols=id_cols, chunk_index=(i if len(chunks) > 1 else None))
-                doc_id = id_prefix + hashlib.md5(key.encode("utf-8")).hexdigest()
+            if max(map(len, texts), default=0) <= max_chars_per_doc:
+                # Chunk policy resolved for the whole frame: nothing needs splitting, so every row is
+                # exactly one doc (stripped text, row key, row metadata) and the per-row loop is skipped
+                docs.extend(t.strip() for t in texts)
+                doc_keys.extend(keys)
+                doc_metas.extend(metas)
             else:
-                fallback_key = "|".join([str(v) for v in row.values]) + f"|chunk:{i}"
-                doc_id = id_prefix + hashlib.md5(fallback_key.encode("utf-8")).hexdigest()
+                for text, base_meta, base_key in zip(texts, metas, keys):
+                    # Chunk if long
+                    chunks = chunk_text(text, max_chars_per_doc) or [""]
+                    n_chunks = len(chunks)
 
-            meta = {k: (None if pd.isna(row.get(k, None)) else row.get(k, None)) for k in meta_cols}
-            if len(chunks) > 1:
-                meta["_chunk"] = i
-                meta["_chunk_count"] = len(chunks)
+                    for i, chunk in enumerate(chunks):
+                        # Same rule with or without id_cols: row key, plus "|i" only for multi-chunk rows
+                        key = base_key if n_chunks == 1 else f"{base_key}|{i}"
+                        doc_keys.append(key)
+                        docs.append(chunk)
+                        # Single-chunk rows reuse the row's record; only chunked rows need their own copy
+                        doc_metas.append(base_meta if n_chunks == 1 else {**base_meta, "_chunk": i, "_chunk_count": n_chunks})
 
-            ids_batch.append(doc_id)
-            docs_batch.append(chunk)
-            metas_batch.append(meta)
+            while len(docs) - submitted >= batch_size:
+                end = submitted + batch_size
+                _submit_batch(
+                    coll, in_flight, abort, docs[submitted:end], doc_metas[submitted:end],
+                    _ids_for_keys(doc_keys[submitted:end], id_prefix), encode_batch_size
+                )
+                submitted = end
 
-        if len(docs_batch) >= batch_size:
-            embeddings = _embed(docs_batch)
-            coll.upsert(documents=docs_batch, metadatas=metas_batch, ids=ids_batch, embeddings=embeddings)
-            docs_batch, ids_batch, metas_batch = [], [], []
+            # Carry the partial batch into the next frame and drop what's already submitted
+            docs, doc_keys, doc_metas = docs[submitted:], doc_keys[submitted:], doc_metas[submitted:]
+            submitted = 0
 
-    if docs_batch:
-        embeddings = _embed(docs_batch)
-        coll.upsert(documents=docs_batch, metadatas=metas_batch, ids=ids_batch, embeddings=embeddings)
+        if docs:
+            _submit_batch(coll, in_flight, abort, docs, doc_metas, _ids_for_keys(doc_keys, id_prefix), encode_batch_size)
+        while in_flight:
+            in_flight.popleft()[1].result()
+    finally:
+        # Only non-empty on error (frames iterator, embed or upsert raised): cancel the rest
+        # and wait, so no batch lands in Chroma after the caller has seen the exception
+        if in_flight:
+            _cancel_in_flight(in_flight, abort)
+    return n_rows
 
 # ---------------- Query helper ---------------- #
 def query_namespace(
@@ -168,5 +518,6 @@ __all__ = [
     "stable_id_from_row",
     "chunk_text",
     "upsert_dataframe_as_docs",
+    "upsert_dataframe_chunks",
     "query_namespace"
 ]